@@ -1,6 +1,9 @@
 import xml.etree.ElementTree as ET
 import pandas as pd
+import numpy as np
+import shapely
 from shapely.geometry import Point, Polygon
+from shapely.strtree import STRtree
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
@@ -10,7 +13,10 @@ import tempfile
 from lxml import etree
 from pykml import parser
 import time
-from collections import defaultdict
+import math
+import json
+import hashlib
+from collections import defaultdict, deque
 
 try:
     from tkinterdnd2 import DND_FILES, TkinterDnD
@@ -18,6 +24,11 @@ except ImportError:
     messagebox.showerror("Error", "tkinterdnd2 is not installed or has issues!")
     exit()
 
+EARTH_RADIUS_M = 6371008.8
+NEAREST_BATCH_SIZE = 10000
+RUN_STATE_FORMAT = "FilterPointsInsidePologon run state"
+RUN_STATE_VERSION = 1
+
 
 class KMLToExcelConverter:
     def __init__(self, root):
@@ -30,7 +41,7 @@ class KMLToExcelConverter:
 
     def setup_ui(self):
         """Initialize the main application UI."""
-        self.root.geometry("600x450")
+        self.root.geometry("600x480")
         self.frame = tk.Frame(self.root, padx=20, pady=20)
         self.frame.pack(fill=tk.BOTH, expand=True)
 
@@ -77,6 +88,34 @@ class KMLToExcelConverter:
         )
         self.convert_lines_check.pack(side=tk.LEFT, padx=5)
 
+        self.incremental_var = tk.BooleanVar(value=False)
+        self.incremental_check = tk.Checkbutton(
+            button_frame, 
+            text="Incremental (use previous run)", 
+            variable=self.incremental_var
+        )
+        self.incremental_check.pack(side=tk.LEFT, padx=5)
+
+        # Nearest feature options for unassigned points
+        nearest_frame = tk.Frame(self.frame)
+        nearest_frame.pack(fill=tk.X, pady=5)
+
+        self.nearest_var = tk.BooleanVar(value=False)
+        self.nearest_check = tk.Checkbutton(
+            nearest_frame, 
+            text="Find Nearest Feature for Unassigned", 
+            variable=self.nearest_var
+        )
+        self.nearest_check.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(nearest_frame, text="Max radius (m):").pack(side=tk.LEFT)
+        self.nearest_radius_var = tk.StringVar(value="1000")
+        tk.Entry(
+            nearest_frame, 
+            textvariable=self.nearest_radius_var, 
+            width=8
+        ).pack(side=tk.LEFT, padx=5)
+
         # Progress area
         progress_frame = tk.LabelFrame(self.frame, text="Progress", padx=10, pady=10)
         progress_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -247,6 +286,16 @@ class KMLToExcelConverter:
                 self.status_var.set("Processing canceled - no features selected")
                 return
             
+            nearest_radius = None
+            if self.nearest_var.get():
+                try:
+                    nearest_radius = float(self.nearest_radius_var.get())
+                except ValueError:
+                    nearest_radius = -1
+                if not (math.isfinite(nearest_radius) and nearest_radius > 0):
+                    self.show_error("Max radius must be a positive number of metres")
+                    return
+            
             output_path = filedialog.asksaveasfilename(
                 defaultextension=".xlsx",
                 filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")],
@@ -257,18 +306,30 @@ class KMLToExcelConverter:
                 self.status_var.set("Processing canceled - no output file selected")
                 return
             
+            previous_state_path = None
+            if self.incremental_var.get():
+                previous_state_path = filedialog.askopenfilename(
+                    title="Select previous run state (cancel for a full run)",
+                    filetypes=[("Run state", "*.json"), ("All files", "*.*")]
+                )
+                if not previous_state_path:
+                    previous_state_path = None
+                    self.status_var.set("No previous run state selected - running full processing")
+            
             # Start the export process
             threading.Thread(
                 target=self.export_to_excel,
                 args=(placemarks, original_polygons, converted_polygons, 
-                     selected_polygons, selected_linestrings, output_path)
+                     selected_polygons, selected_linestrings, output_path, nearest_radius,
+                     previous_state_path)
             ).start()
 
         except Exception as e:
             self.show_error(f"Error in selection dialog: {str(e)}")
 
     def export_to_excel(self, placemarks, original_polygons, converted_polygons, 
-                      selected_polygons, selected_linestrings, output_path):
+                      selected_polygons, selected_linestrings, output_path, nearest_radius=None,
+                      previous_state_path=None):
         """Export the results to an Excel file."""
         try:
             start_time = time.time()
@@ -279,27 +340,46 @@ class KMLToExcelConverter:
             linestring_data = defaultdict(list)
             assigned_points = set()
             
-            # Process original polygons
-            for poly_name, polygon in original_polygons:
-                if not self.running:
-                    return
-                    
-                if poly_name in selected_polygons:
-                    for pt_name, point in placemarks:
-                        if polygon.contains(point):
-                            polygon_data[poly_name].append(pt_name)
-                            assigned_points.add(pt_name)
-            
-            # Process converted polygons (from LineStrings)
-            for line_name, polygon in converted_polygons:
-                if not self.running:
-                    return
-                    
-                if line_name in selected_linestrings:
-                    for pt_name, point in placemarks:
-                        if polygon.contains(point):
-                            linestring_data[line_name].append(pt_name)
-                            assigned_points.add(pt_name)
+            # Fingerprint points and all features, keeping the selected ones apart
+            point_entries = self.fingerprint_placemarks(
+                [(pt_name, "Point", point) for pt_name, point in placemarks]
+            )
+            all_feature_entries = self.fingerprint_placemarks(
+                [(name, "Polygon", polygon) for name, polygon in original_polygons] +
+                [(name, "LineString", polygon) for name, polygon in converted_polygons]
+            )
+            feature_entries = [
+                entry for entry in all_feature_entries
+                if entry[1] in (selected_polygons if entry[2] == "Polygon" else selected_linestrings)
+            ]
+            
+            previous_state = None
+            if previous_state_path:
+                self.update_progress(62, "Loading previous run state...")
+                previous_state = self.load_run_state(previous_state_path)
+                if previous_state is None:
+                    self.show_warning(
+                        "Run State", 
+                        f"{os.path.basename(previous_state_path)} is not a run state file - running full processing"
+                    )
+                else:
+                    previous_state = self.align_previous_state(point_entries, all_feature_entries, previous_state)
+            
+            if not self.running:
+                return
+            
+            self.update_progress(65, "Finding points inside features...")
+            membership = self.compute_membership(point_entries, feature_entries, previous_state)
+            
+            if not self.running:
+                return
+            
+            for key, name, feature_type, _, _ in feature_entries:
+                data = polygon_data if feature_type == "Polygon" else linestring_data
+                for index in membership[key]:
+                    pt_name = point_entries[index][1]
+                    data[name].append(pt_name)
+                    assigned_points.add(pt_name)
             
             # Prepare final data structures
             self.update_progress(80, "Formatting data...")
@@ -324,12 +404,46 @@ class KMLToExcelConverter:
             
             # Unassigned points
             unassigned_output = []
-            for pt_name, _ in placemarks:
+            unassigned_points = []
+            for pt_name, point in placemarks:
                 if pt_name not in assigned_points:
                     unassigned_output.append({
                         "Point Name": pt_name,
                         "Status": "Not in any selected feature"
                     })
+                    unassigned_points.append(point)
+            
+            # Nearest selected feature for each unassigned point
+            if nearest_radius and unassigned_points:
+                self.update_progress(85, "Finding nearest features...")
+                nearest = self.find_nearest_features(
+                    unassigned_points, 
+                    [(name, feature_type, geom) for _, name, feature_type, geom, _ in feature_entries], 
+                    nearest_radius
+                )
+                for row, match in zip(unassigned_output, nearest):
+                    if match is None:
+                        row["Status"] = f"Not in any selected feature, none within {nearest_radius:g} m"
+                        row["Nearest Feature"] = ""
+                        row["Nearest Feature Type"] = ""
+                        row["Distance (m)"] = None
+                    else:
+                        row["Nearest Feature"] = match[0]
+                        row["Nearest Feature Type"] = match[1]
+                        row["Distance (m)"] = round(match[2], 1)
+            
+            if not self.running:
+                return
+            
+            # Change report against the previous run
+            change_output = []
+            if previous_state is not None:
+                change_output = self.build_change_report(
+                    point_entries, all_feature_entries, membership, previous_state
+                )
+            
+            if not self.running:
+                return
             
             # Write to Excel
             self.update_progress(90, "Writing to Excel...")
@@ -354,16 +468,368 @@ class KMLToExcelConverter:
                         sheet_name='Unassigned', 
                         index=False
                     )
+                
+                if previous_state is not None:
+                    if not change_output:
+                        change_output.append({"Type": "", "Name": "", "Change": "No changes",
+                                              "Previous Features": "", "Current Features": ""})
+                    pd.DataFrame(change_output).to_excel(
+                        writer, 
+                        sheet_name='Changes', 
+                        index=False
+                    )
+            
+            # Run state for the next incremental run
+            state_path = os.path.splitext(output_path)[0] + "_state.json"
+            with open(state_path, 'w', encoding='utf-8') as f:
+                json.dump(self.build_run_state(point_entries, all_feature_entries, membership), f)
+            saved_message = f"Excel file saved at:\n{output_path}\n\nRun state saved at:\n{state_path}"
             
             elapsed_time = time.time() - start_time
             self.update_progress(100, f"Processing complete in {elapsed_time:.1f} seconds!")
             self.status_var.set(f"Completed: {os.path.basename(output_path)}")
             self.try_again_button.config(state=tk.NORMAL)
-            messagebox.showinfo("Completed", f"Excel file saved at:\n{output_path}")
+            messagebox.showinfo("Completed", saved_message)
 
         except Exception as e:
             self.show_error(f"Error during export: {str(e)}")
 
+    def fingerprint_placemarks(self, items):
+        """Key and fingerprint placemarks from their name and geometry.
+
+        items is a list of (name, type, geometry) tuples. Returns a list of
+        (key, name, type, geometry, fingerprint) tuples, where repeated names
+        of the same type are told apart by their occurrence in the document.
+        """
+        occurrences = defaultdict(int)
+        fingerprinted = []
+        for name, item_type, geom in items:
+            occurrence = occurrences[(item_type, name)]
+            occurrences[(item_type, name)] += 1
+            key = f"{item_type}:{name}#{occurrence}"
+            fingerprint = hashlib.sha1(name.encode("utf-8") + b"\0" + geom.wkb).hexdigest()
+            fingerprinted.append((key, name, item_type, geom, fingerprint))
+        return fingerprinted
+
+    def compute_membership(self, points, features, previous_state=None):
+        """Map each selected feature key to the indices of the points it contains.
+
+        Without a previous state every point is tested. With one, features that
+        were selected and unchanged keep their previous unchanged points, only
+        added or moved points are tested against those features, and only the
+        remaining features are tested against all points.
+        """
+        previous_points = previous_state["points"] if previous_state else {}
+        previous_features = previous_state["features"] if previous_state else {}
+        
+        point_index = {point[0]: i for i, point in enumerate(points)}
+        retest_points = [
+            i for i, (key, _, _, _, fingerprint) in enumerate(points)
+            if previous_points.get(key, {}).get("fingerprint") != fingerprint
+        ]
+        retest_set = set(retest_points)
+        
+        membership = {}
+        reused_features = []
+        recompute_features = []
+        for j, (key, _, _, _, fingerprint) in enumerate(features):
+            previous = previous_features.get(key)
+            if previous is not None and previous["selected"] and previous["fingerprint"] == fingerprint:
+                membership[key] = [
+                    point_index[pt_key] for pt_key in previous["points"]
+                    if pt_key in point_index and point_index[pt_key] not in retest_set
+                ]
+                reused_features.append(j)
+            else:
+                membership[key] = []
+                recompute_features.append(j)
+        
+        # Added or moved points against unchanged features
+        if retest_points and reused_features:
+            tree = STRtree([features[j][3] for j in reused_features])
+            point_idx, feature_idx = tree.query(
+                [points[i][3] for i in retest_points], 
+                predicate="within"
+            )
+            for i, j in zip(point_idx, feature_idx):
+                membership[features[reused_features[j]][0]].append(retest_points[i])
+        
+        # Added or changed features against all points
+        if recompute_features and points:
+            tree = STRtree([point[3] for point in points])
+            feature_idx, point_idx = tree.query(
+                [features[j][3] for j in recompute_features], 
+                predicate="contains"
+            )
+            for j, i in zip(feature_idx, point_idx):
+                membership[features[recompute_features[j]][0]].append(int(i))
+        
+        for key in membership:
+            membership[key].sort()
+        return membership
+
+    def build_run_state(self, points, features, membership):
+        """Build the JSON-serialisable state used by the next incremental run.
+
+        features holds every feature in the KML; the selected ones are those
+        with an entry in membership.
+        """
+        return {
+            "format": RUN_STATE_FORMAT,
+            "version": RUN_STATE_VERSION,
+            "points": {
+                key: {"name": name, "type": point_type, "fingerprint": fingerprint}
+                for key, name, point_type, _, fingerprint in points
+            },
+            "features": {
+                key: {
+                    "name": name,
+                    "type": feature_type,
+                    "fingerprint": fingerprint,
+                    "selected": key in membership,
+                    "points": [points[i][0] for i in membership.get(key, [])]
+                }
+                for key, name, feature_type, _, fingerprint in features
+            }
+        }
+
+    def load_run_state(self, path):
+        """Load a previous run state, or return None if the file is not one."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if (not isinstance(state, dict) or state.get("format") != RUN_STATE_FORMAT
+                or state.get("version") != RUN_STATE_VERSION):
+            return None
+        return state
+
+    def align_previous_state(self, points, features, previous_state):
+        """Rekey a previous run state to the keys of the current placemarks.
+
+        Removing one of several placemarks with the same name shifts the
+        occurrence keys of the rest, so previous placemarks are paired with
+        current ones by type, name and fingerprint first and only the rest by
+        occurrence order. Unpaired previous placemarks keep a key of their own.
+        """
+        point_keys = self.pair_previous_keys(points, previous_state["points"])
+        feature_keys = self.pair_previous_keys(features, previous_state["features"])
+        
+        def rekey(key_map, key):
+            return key_map.get(key, f"previous:{key}")
+        
+        return {
+            "points": {
+                rekey(point_keys, key): previous
+                for key, previous in previous_state["points"].items()
+            },
+            "features": {
+                rekey(feature_keys, key): dict(
+                    previous, 
+                    points=[rekey(point_keys, pt_key) for pt_key in previous["points"]]
+                )
+                for key, previous in previous_state["features"].items()
+            }
+        }
+
+    def pair_previous_keys(self, entries, previous_entries):
+        """Map previous placemark keys to the keys of matching current placemarks."""
+        exact = defaultdict(deque)
+        for key, previous in previous_entries.items():
+            exact[(previous["type"], previous["name"], previous["fingerprint"])].append(key)
+        
+        key_map = {}
+        unpaired = []
+        for entry in entries:
+            key, name, item_type, _, fingerprint = entry
+            candidates = exact[(item_type, name, fingerprint)]
+            if candidates:
+                key_map[candidates.popleft()] = key
+            else:
+                unpaired.append(entry)
+        
+        # Moved or edited placemarks fall back to occurrence order by name
+        by_name = defaultdict(deque)
+        for key, previous in previous_entries.items():
+            if key not in key_map:
+                by_name[(previous["type"], previous["name"])].append(key)
+        for key, name, item_type, _, _ in unpaired:
+            candidates = by_name[(item_type, name)]
+            if candidates:
+                key_map[candidates.popleft()] = key
+        return key_map
+
+    def build_change_report(self, points, features, membership, previous_state):
+        """List changes to features and points since the previous run.
+
+        features holds every feature in the KML. Selection changes are reported
+        separately from geometry changes, and points only count as moved
+        between features that were selected in both runs.
+        """
+        previous_points = previous_state["points"]
+        previous_features = previous_state["features"]
+        feature_names = {key: previous["name"] for key, previous in previous_features.items()}
+        report = []
+        
+        current_feature_keys = set()
+        for key, name, feature_type, _, fingerprint in features:
+            current_feature_keys.add(key)
+            feature_names[key] = name
+            previous = previous_features.get(key)
+            changes = []
+            if previous is None:
+                changes.append("Added")
+            else:
+                if previous["fingerprint"] != fingerprint:
+                    changes.append("Geometry changed")
+                if previous["selected"] != (key in membership):
+                    changes.append("Newly selected" if key in membership else "No longer selected")
+            for change in changes:
+                report.append({"Type": feature_type, "Name": name, "Change": change,
+                               "Previous Features": "", "Current Features": ""})
+        for key, previous in previous_features.items():
+            if key not in current_feature_keys:
+                report.append({"Type": previous["type"], "Name": previous["name"], "Change": "Removed",
+                               "Previous Features": "", "Current Features": ""})
+        
+        # Features containing each point before and now
+        previous_assignment = defaultdict(list)
+        for key, previous in previous_features.items():
+            for pt_key in previous["points"]:
+                previous_assignment[pt_key].append(key)
+        current_assignment = defaultdict(list)
+        for key, indices in membership.items():
+            for i in indices:
+                current_assignment[points[i][0]].append(key)
+        compared = {key for key in membership if previous_features.get(key, {}).get("selected")}
+        
+        def describe(keys):
+            return ", ".join(feature_names[key] for key in keys)
+        
+        current_point_keys = set()
+        for key, name, _, _, _ in points:
+            current_point_keys.add(key)
+            if key not in previous_points:
+                report.append({"Type": "Point", "Name": name, "Change": "Added",
+                               "Previous Features": "",
+                               "Current Features": describe(current_assignment[key])})
+                continue
+            before = [k for k in previous_assignment[key] if k in compared]
+            after = [k for k in current_assignment[key] if k in compared]
+            if sorted(before) != sorted(after):
+                report.append({"Type": "Point", "Name": name, "Change": "Moved between features",
+                               "Previous Features": describe(before),
+                               "Current Features": describe(after)})
+        for key, previous in previous_points.items():
+            if key not in current_point_keys:
+                report.append({"Type": "Point", "Name": previous["name"], "Change": "Removed",
+                               "Previous Features": describe(previous_assignment[key]),
+                               "Current Features": ""})
+        return report
+
+    def find_nearest_features(self, points, features, max_distance):
+        """Find the nearest feature to each point within max_distance metres.
+
+        features is a list of (name, feature type, geometry) tuples. Returns a
+        list aligned with points holding (name, feature type, distance) or None
+        when no feature lies within the search radius. Points are processed in
+        batches of NEAREST_BATCH_SIZE to keep memory bounded.
+        """
+        results = [None] * len(points)
+        if not features or not points:
+            return results
+        
+        feature_geoms = np.array([geom for _, _, geom in features], dtype=object)
+        tree = STRtree(feature_geoms)
+        
+        for start in range(0, len(points), NEAREST_BATCH_SIZE):
+            if not self.running:
+                break
+                
+            batch = np.array(points[start:start + NEAREST_BATCH_SIZE], dtype=object)
+            point_idx, feature_idx, distances = self.nearest_in_batch(
+                tree, feature_geoms, batch, max_distance
+            )
+            for i, j, distance in zip(point_idx, feature_idx, distances):
+                name, feature_type, _ = features[j]
+                results[start + i] = (name, feature_type, float(distance))
+        return results
+
+    def nearest_in_batch(self, tree, feature_geoms, points, max_distance):
+        """Find the nearest feature in metres for one batch of lon/lat points.
+
+        Returns arrays of point indices, feature indices and distances for the
+        points that have a feature within max_distance.
+        """
+        metres_per_degree = EARTH_RADIUS_M * math.pi / 180
+        x = shapely.get_x(points)
+        y = shapely.get_y(points)
+        
+        # Nearest feature in lon/lat, within the widest degree radius that
+        # max_distance covers at each point's latitude
+        lat_reach = np.minimum(np.abs(y) + max_distance / metres_per_degree, 89.9)
+        search_radius = max_distance / (metres_per_degree * np.cos(np.radians(lat_reach)))
+        (point_idx, _), degree_distances = tree.query_nearest(
+            points, 
+            max_distance=float(search_radius.max()), 
+            return_distance=True
+        )
+        nearest_degrees = np.full(len(points), np.inf)
+        np.minimum.at(nearest_degrees, point_idx, degree_distances)
+        found = np.flatnonzero(nearest_degrees <= search_radius)
+        
+        # A degree of latitude is the longest, so that feature bounds the
+        # distance in metres; only features inside the bound can be nearer.
+        # The padding keeps touching features from clipping to nothing.
+        bound = np.minimum(metres_per_degree * nearest_degrees[found], max_distance) * 1.01 + 1
+        lat_radius = bound / metres_per_degree
+        lon_radius = bound / (
+            metres_per_degree * np.cos(np.radians(np.minimum(np.abs(y[found]) + lat_radius, 89.9)))
+        )
+        candidate_idx, feature_idx = tree.query(
+            points[found], 
+            predicate="dwithin", 
+            distance=lon_radius
+        )
+        point_idx = found[candidate_idx]
+        
+        # Clip candidates to each point's search box and measure in metres
+        search_boxes = shapely.box(
+            x[point_idx] - lon_radius[candidate_idx], 
+            y[point_idx] - lat_radius[candidate_idx], 
+            x[point_idx] + lon_radius[candidate_idx], 
+            y[point_idx] + lat_radius[candidate_idx]
+        )
+        clipped = shapely.intersection(feature_geoms[feature_idx], search_boxes)
+        distances = self.local_distances(points[point_idx], clipped)
+        within = distances <= max_distance
+        point_idx, feature_idx, distances = point_idx[within], feature_idx[within], distances[within]
+        order = np.lexsort((feature_idx, distances, point_idx))
+        point_idx, feature_idx, distances = point_idx[order], feature_idx[order], distances[order]
+        
+        _, first = np.unique(point_idx, return_index=True)
+        return point_idx[first], feature_idx[first], distances[first]
+
+    def local_distances(self, points, geometries):
+        """Distances in metres between paired lon/lat points and geometries.
+
+        Each pair is projected to an equirectangular plane centred on its point.
+        """
+        metres_per_degree = EARTH_RADIUS_M * math.pi / 180
+        origin = np.column_stack([shapely.get_x(points), shapely.get_y(points)])
+        scale = np.column_stack([
+            metres_per_degree * np.cos(np.radians(origin[:, 1])), 
+            np.full(len(points), metres_per_degree)
+        ])
+        
+        def project(geoms):
+            coords, index = shapely.get_coordinates(geoms, return_index=True)
+            return shapely.set_coordinates(geoms.copy(), (coords - origin[index]) * scale[index])
+        
+        return shapely.distance(project(points), project(geometries))
+
     def convert_linestrings_to_polygons(self, input_file):
         """Convert LineStrings in KML to Polygons."""
         try: